@@ -4,7 +4,33 @@ import psycopg2
 from psycopg2 import Error
 import sys
 import csv
+import io
 import os
+import re
+
+PAGE_SIZE = 100
+# Length of contacts.name VARCHAR(100)
+NAME_MAX_LENGTH = 100
+
+# Accepted phone formats: optional leading +, then ASCII digits, spaces,
+# dashes, dots and parentheses; at least 7 digits, and 7-20 characters to fit
+# contacts.phone VARCHAR(20). Use with fullmatch() so a trailing newline is
+# rejected too
+_PHONE_RE = re.compile(r'(?=.{7,20}\Z)(?=(?:\D*\d){7})\+?[\d \-().]+', re.ASCII)
+
+DEFAULT_SOCKET_DIR = '/var/run/postgresql'
+
+def get_db_host():
+    """Database host, or a Unix socket directory when one is asked for"""
+    # The socket is opt-in: it authenticates against pg_hba's "local" lines
+    # (often peer auth), so an explicit localhost keeps using TCP
+    socket_dir = os.getenv('DATABASE_SOCKET_DIR')
+    if socket_dir:
+        return socket_dir
+    host = os.getenv('DATABASE_HOST', 'postgres')
+    if host == '' and os.path.isdir(DEFAULT_SOCKET_DIR):
+        return DEFAULT_SOCKET_DIR
+    return host
 
 class PhoneDirectory:
     def __init__(self):
@@ -15,10 +41,11 @@ class PhoneDirectory:
         """Establish database connection"""
         try:
             self.connection = psycopg2.connect(
-                host="postgres",
-                database="phone_directory",
-                user="postgres",
-                password="postgres"  # Change this to your password
+                host=get_db_host(),
+                database=os.getenv('DATABASE_NAME', 'phone_directory'),
+                user=os.getenv('DATABASE_USER', 'postgres'),
+                password=os.getenv('DATABASE_PASSWORD', 'postgres'),
+                port=os.getenv('DATABASE_PORT', '5432')
             )
             print("✓ Connected to PostgreSQL database successfully!")
             return True
@@ -27,37 +54,50 @@ class PhoneDirectory:
             print("\nPlease ensure:")
             print("1. PostgreSQL is running")
             print("2. Database 'phone_directory' exists")
-            print("3. Check username/password in connect() method")
+            print("3. Check the DATABASE_* environment variables")
             return False
     
     def add_contact(self, name, phone, address=""):
         """Add a new contact to the directory"""
+        if not _PHONE_RE.fullmatch(phone):
+            print(f"✗ Invalid phone number '{phone}'!")
+            return False
         try:
             cursor = self.connection.cursor()
-            cursor.execute(
-                "INSERT INTO contacts (name, phone, address) VALUES (%s, %s, %s)",
-                (name, phone, address)
-            )
+            cursor.execute("""
+                INSERT INTO contacts (name, phone, address) VALUES (%s, %s, %s)
+                ON CONFLICT (phone) DO NOTHING RETURNING id
+            """, (name, phone, address))
+            row = cursor.fetchone()
             self.connection.commit()
+            if row is None:
+                print(f"✗ Phone number '{phone}' already exists!")
+                return False
             print(f"✓ Contact '{name}' added successfully!")
             return True
-        except psycopg2.IntegrityError:
-            print(f"✗ Phone number '{phone}' already exists!")
-            return False
         except Error as e:
+            self.connection.rollback()
             print(f"✗ Error adding contact: {e}")
             return False
     
-    def search_contacts(self, search_term):
-        """Search contacts by name, phone, or address"""
+    def search_contacts(self, search_term, substring=False):
+        """Search contacts by name/phone prefix, or anywhere in name, phone, or address"""
         try:
             cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT id, name, phone, address 
-                FROM contacts 
-                WHERE name ILIKE %s OR phone ILIKE %s OR address ILIKE %s
-                ORDER BY name
-            """, (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
+            if substring:
+                cursor.execute("""
+                    SELECT id, name, phone, address 
+                    FROM contacts 
+                    WHERE search_blob ILIKE %s
+                    ORDER BY name
+                """, (f'%{search_term.lower()}%',))
+            else:
+                cursor.execute("""
+                    SELECT id, name, phone, address 
+                    FROM contacts 
+                    WHERE lower(name) LIKE %s OR lower(phone) LIKE %s
+                    ORDER BY name
+                """, (f'{search_term.lower()}%', f'{search_term.lower()}%'))
             
             results = cursor.fetchall()
             return results
@@ -65,11 +105,21 @@ class PhoneDirectory:
             print(f"✗ Error searching contacts: {e}")
             return []
     
-    def view_all_contacts(self):
-        """View all contacts in the directory"""
+    def view_all_contacts(self, after=None, limit=PAGE_SIZE):
+        """View one page of contacts, starting after the (name, id) keyset cursor"""
         try:
             cursor = self.connection.cursor()
-            cursor.execute("SELECT id, name, phone, address FROM contacts ORDER BY name")
+            if after is None:
+                cursor.execute("""
+                    SELECT id, name, phone, address FROM contacts
+                    ORDER BY name, id LIMIT %s
+                """, (limit,))
+            else:
+                cursor.execute("""
+                    SELECT id, name, phone, address FROM contacts
+                    WHERE (name, id) > (%s, %s)
+                    ORDER BY name, id LIMIT %s
+                """, (after[0], after[1], limit))
             return cursor.fetchall()
         except Error as e:
             print(f"✗ Error fetching contacts: {e}")
@@ -77,6 +127,9 @@ class PhoneDirectory:
     
     def update_contact(self, contact_id, name, phone, address=""):
         """Update an existing contact"""
+        if not _PHONE_RE.fullmatch(phone):
+            print(f"✗ Invalid phone number '{phone}'!")
+            return False
         try:
             cursor = self.connection.cursor()
             cursor.execute("""
@@ -113,27 +166,34 @@ class PhoneDirectory:
     
     def export_to_csv(self, filename="contacts_export.csv"):
         """Export all contacts to CSV file"""
+        # Copy into a side file first so an empty export leaves any existing
+        # file untouched, without a separate query to check for contacts
+        partial = f"{filename}.part"
         try:
-            contacts = self.view_all_contacts()
-            if not contacts:
+            with open(partial, 'w', newline='', encoding='utf-8') as file:
+                # Let Postgres serialize the CSV and stream it straight to the file
+                cursor = self.connection.cursor()
+                cursor.copy_expert("""
+                    COPY (
+                        SELECT id AS "ID", name AS "Name", phone AS "Phone",
+                               address AS "Address", created_at AS "Created At"
+                        FROM contacts ORDER BY name
+                    ) TO STDOUT WITH CSV HEADER
+                """, file)
+            
+            if cursor.rowcount == 0:
                 print("✗ No contacts to export!")
                 return False
             
-            with open(filename, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow(['ID', 'Name', 'Phone', 'Address', 'Created At'])
-                
-                cursor = self.connection.cursor()
-                cursor.execute("SELECT id, name, phone, address, created_at FROM contacts ORDER BY name")
-                
-                for row in cursor.fetchall():
-                    writer.writerow(row)
-            
-            print(f"✓ Exported {len(contacts)} contacts to '{filename}'")
+            os.replace(partial, filename)
+            print(f"✓ Exported {cursor.rowcount} contacts to '{filename}'")
             return True
         except Error as e:
             print(f"✗ Error exporting contacts: {e}")
             return False
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
     
     def import_from_csv(self, filename):
         """Import contacts from CSV file"""
@@ -142,7 +202,11 @@ class PhoneDirectory:
                 print(f"✗ File '{filename}' not found!")
                 return False
             
-            imported_count = 0
+            # Normalize the rows into a name,phone,address CSV buffer for COPY
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            row_count = 0
+            seen_phones = set()
             skipped_count = 0
             
             with open(filename, 'r', encoding='utf-8') as file:
@@ -155,10 +219,43 @@ class PhoneDirectory:
                         address = row.get('Address', row.get('address', ''))
                         
                         if name and phone:
-                            if self.add_contact(name, phone, address):
-                                imported_count += 1
-                            else:
+                            # One over-long value would fail the whole merge
+                            if (phone in seen_phones or not _PHONE_RE.fullmatch(phone)
+                                    or len(name) > NAME_MAX_LENGTH):
                                 skipped_count += 1
+                            else:
+                                seen_phones.add(phone)
+                                writer.writerow((name, phone, address))
+                                row_count += 1
+            buffer.seek(0)
+            
+            # Bulk load into a staging table, then merge in one transaction;
+            # existing phones are skipped
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute("""
+                    CREATE TEMP TABLE t_contacts (name TEXT, phone TEXT, address TEXT)
+                    ON COMMIT DROP
+                """)
+                cursor.copy_expert(
+                    # csv.writer writes '' unquoted, which COPY would read as
+                    # NULL; keep it '' like add_contact() stores
+                    "COPY t_contacts (name, phone, address) FROM STDIN "
+                    "WITH (FORMAT csv, FORCE_NOT_NULL (address))",
+                    buffer
+                )
+                cursor.execute("""
+                    INSERT INTO contacts (name, phone, address)
+                    SELECT name, phone, address FROM t_contacts
+                    ON CONFLICT (phone) DO NOTHING
+                """)
+                imported_count = cursor.rowcount
+                self.connection.commit()
+            except Error:
+                self.connection.rollback()
+                raise
+            
+            skipped_count += row_count - imported_count
             
             print(f"✓ Imported {imported_count} contacts")
             if skipped_count > 0:
@@ -237,9 +334,11 @@ def main():
             print("\n" + "-"*40)
             print("SEARCH CONTACTS")
             print("-"*40)
-            search_term = input("Search (name, phone, or address): ").strip()
+            print("Tip: searching the start of a name or phone is fastest.")
+            search_term = input("Search (name or phone prefix): ").strip()
             if search_term:
-                results = directory.search_contacts(search_term)
+                anywhere = input("Match anywhere, including address? (y/N): ").strip().lower()
+                results = directory.search_contacts(search_term, substring=(anywhere == 'y'))
                 display_contacts(results)
                 print(f"\nFound {len(results)} contact(s).")
             else:
@@ -249,9 +348,21 @@ def main():
             print("\n" + "-"*40)
             print("ALL CONTACTS")
             print("-"*40)
+            total = 0
             contacts = directory.view_all_contacts()
-            display_contacts(contacts)
-            print(f"\nTotal: {len(contacts)} contact(s)")
+            while True:
+                display_contacts(contacts)
+                total += len(contacts)
+                if len(contacts) < PAGE_SIZE:
+                    break
+                more = input("Press Enter for more, or 'q' to stop: ").strip().lower()
+                if more == 'q':
+                    break
+                last = contacts[-1]
+                contacts = directory.view_all_contacts(after=(last[1], last[0]))
+                if not contacts:
+                    break
+            print(f"\nShown: {total} contact(s)")
         
         elif choice == '4':
             print("\n" + "-"*40)
@@ -1,8 +1,12 @@
 -- File: database/init.sql
 -- Initialize the phone directory database
 
+-- Trigram support for substring search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Drop table if exists (for clean setup)
 DROP TABLE IF EXISTS contacts;
+DROP TABLE IF EXISTS contacts_version;
 
 -- Create contacts table (matching app.py schema)
 CREATE TABLE contacts (
@@ -11,12 +15,19 @@ CREATE TABLE contacts (
     phone VARCHAR(20) NOT NULL UNIQUE,
     address TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    search_blob TEXT GENERATED ALWAYS AS (
+        lower(name || ' ' || phone || ' ' || COALESCE(address, ''))
+    ) STORED
 );
 
 -- Create indexes for better performance
-CREATE INDEX idx_contacts_name ON contacts(name);
 CREATE INDEX idx_contacts_phone ON contacts(phone);
+CREATE INDEX contacts_search_trgm ON contacts USING gin (search_blob gin_trgm_ops);
+CREATE INDEX contacts_name_lower ON contacts (lower(name) text_pattern_ops);
+CREATE INDEX contacts_phone_lower ON contacts (lower(phone) text_pattern_ops);
+-- Ordering index: serves ORDER BY name and (name, id) keyset pages without a sort
+CREATE INDEX contacts_name_id ON contacts(name, id);
 
 -- Insert sample data
 INSERT INTO contacts (name, phone, address) VALUES
@@ -46,8 +57,61 @@ CREATE TRIGGER update_contacts_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Data version for the web app's response cache; bumped by every statement
+-- that changes rows. Writers that change rows queue on this single row's
+-- lock until they commit, which serializes them; that is acceptable at a
+-- directory's write rate but makes this a poor fit for write-heavy tables.
+CREATE TABLE contacts_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO contacts_version DEFAULT VALUES;
+
+CREATE OR REPLACE FUNCTION bump_contacts_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Statements that changed nothing (ON CONFLICT DO NOTHING on a duplicate,
+    -- 0-row UPDATE/DELETE) leave the version, and the row lock, alone
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NOT EXISTS (SELECT 1 FROM new_rows) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT 1 FROM old_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    UPDATE contacts_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER bump_contacts_version_insert
+    AFTER INSERT ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
+
+CREATE TRIGGER bump_contacts_version_update
+    AFTER UPDATE ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
+
+CREATE TRIGGER bump_contacts_version_delete
+    AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
+
+CREATE TRIGGER bump_contacts_version_truncate
+    AFTER TRUNCATE ON contacts
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
+
 -- Grant permissions
 GRANT ALL PRIVILEGES ON TABLE contacts TO postgres;
+GRANT ALL PRIVILEGES ON TABLE contacts_version TO postgres;
 GRANT USAGE, SELECT ON SEQUENCE contacts_id_seq TO postgres;
 
 -- Display success message
@@ -0,0 +1,13 @@
+-- File: database/migrations/001_contacts_search_trgm.sql
+-- Add a trigram-indexed search column to an existing contacts table
+-- Apply with: psql -U postgres -d phone_directory -f 001_contacts_search_trgm.sql
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_blob TEXT
+    GENERATED ALWAYS AS (
+        lower(name || ' ' || phone || ' ' || COALESCE(address, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS contacts_search_trgm
+    ON contacts USING gin (search_blob gin_trgm_ops);
@@ -0,0 +1,9 @@
+-- File: database/migrations/002_contacts_prefix_search.sql
+-- B-tree indexes backing case-insensitive prefix search on name and phone
+-- Apply with: psql -U postgres -d phone_directory -f 002_contacts_prefix_search.sql
+
+CREATE INDEX IF NOT EXISTS contacts_name_lower
+    ON contacts (lower(name) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS contacts_phone_lower
+    ON contacts (lower(phone) text_pattern_ops);
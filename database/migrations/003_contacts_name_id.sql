@@ -0,0 +1,14 @@
+-- File: database/migrations/003_contacts_name_id.sql
+-- Ordering index on (name, id) backing listings ordered by name and keyset
+-- pagination over (name, id), so neither needs a sort.
+-- Replaces idx_contacts_name, which it makes redundant.
+-- Apply with: psql -U postgres -d phone_directory -f 003_contacts_name_id.sql
+--
+-- Verify afterwards (expect "Index Scan using contacts_name_id", no Sort):
+--   ANALYZE contacts;
+--   EXPLAIN (ANALYZE, BUFFERS)
+--     SELECT id, name, phone, address FROM contacts ORDER BY name, id LIMIT 100;
+
+CREATE INDEX IF NOT EXISTS contacts_name_id ON contacts(name, id);
+
+DROP INDEX IF EXISTS idx_contacts_name;
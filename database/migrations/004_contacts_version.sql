@@ -0,0 +1,57 @@
+-- File: database/migrations/004_contacts_version.sql
+-- Single-row data version used as the web app's response cache key
+-- Apply with: psql -U postgres -d phone_directory -f 004_contacts_version.sql
+
+-- Data version for the web app's response cache (see database/init.sql for
+-- the locking trade-off)
+CREATE TABLE IF NOT EXISTS contacts_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO contacts_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_contacts_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Statements that changed nothing (ON CONFLICT DO NOTHING on a duplicate,
+    -- 0-row UPDATE/DELETE) leave the version, and the row lock, alone
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NOT EXISTS (SELECT 1 FROM new_rows) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT 1 FROM old_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    UPDATE contacts_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS bump_contacts_version_insert ON contacts;
+DROP TRIGGER IF EXISTS bump_contacts_version_update ON contacts;
+DROP TRIGGER IF EXISTS bump_contacts_version_delete ON contacts;
+DROP TRIGGER IF EXISTS bump_contacts_version_truncate ON contacts;
+CREATE TRIGGER bump_contacts_version_insert
+    AFTER INSERT ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
+
+CREATE TRIGGER bump_contacts_version_update
+    AFTER UPDATE ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
+
+CREATE TRIGGER bump_contacts_version_delete
+    AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
+
+CREATE TRIGGER bump_contacts_version_truncate
+    AFTER TRUNCATE ON contacts
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_contacts_version();
@@ -1,27 +1,185 @@
 # File: web/app.py
-from flask import Flask, render_template, request, jsonify, send_file
-import psycopg2
+import os
+
+# Under gevent workers, patch the stdlib and psycopg2 before anything else is
+# imported so blocking socket and database waits yield to other requests.
+# Green psycopg2 cannot run copy_expert(), so the web app must not use COPY
+if os.getenv('GEVENT_PATCH', 'false').lower() == 'true':
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+from flask import Flask, render_template, request, jsonify, send_file, g
+from flask.json.provider import JSONProvider
+import orjson
 from psycopg2 import Error
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from functools import lru_cache
 import csv
+import hashlib
 import io
-import os
+import re
+import tempfile
+import threading
+import time
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that serializes with orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping a str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
-def get_db_connection():
-    """Get database connection using environment variables"""
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv('DATABASE_HOST', 'postgres'),
-            database=os.getenv('DATABASE_NAME', 'phone_directory'),
-            user=os.getenv('DATABASE_USER', 'postgres'),
-            password=os.getenv('DATABASE_PASSWORD', 'postgres'),
-            port=os.getenv('DATABASE_PORT', '5432')
-        )
-        return conn
-    except Error as e:
-        app.logger.error(f"Database connection error: {e}")
-        raise
+# Accepted phone formats: optional leading +, then ASCII digits, spaces,
+# dashes, dots and parentheses; at least 7 digits, and 7-20 characters to fit
+# contacts.phone VARCHAR(20). Use with fullmatch() so a trailing newline is
+# rejected too
+_PHONE_RE = re.compile(r'(?=.{7,20}\Z)(?=(?:\D*\d){7})\+?[\d \-().]+', re.ASCII)
+
+# Column order of the rows in GET /api/contacts responses
+CONTACT_COLUMNS = ['id', 'name', 'phone', 'address']
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+EXPORT_SPOOL_SIZE = 1024 * 1024
+DEFAULT_SOCKET_DIR = '/var/run/postgresql'
+POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT', '30'))
+HEALTH_POOL_TIMEOUT = 0.5
+# How long /health keeps calling a fully busy pool healthy before failing
+HEALTH_BUSY_GRACE = 2 * POOL_TIMEOUT
+EXPORT_SQL = "SELECT name, phone, address, created_at FROM contacts ORDER BY name"
+
+# Server-side prepared statements for the hot CRUD and listing paths, created
+# once per pooled connection so Postgres parses and plans them only once per
+# session. Searches stay unprepared: a generic plan for LIKE $1 cannot use the
+# text_pattern_ops or trigram indexes, which need to see the pattern
+PREPARED_STATEMENTS = """
+    PREPARE contacts_version_stmt AS
+        SELECT version FROM contacts_version;
+    PREPARE list_contacts_stmt(int) AS
+        SELECT id, name, phone, address FROM contacts
+        ORDER BY name, id LIMIT $1;
+    PREPARE list_contacts_after_stmt(text, int, int) AS
+        SELECT id, name, phone, address FROM contacts
+        WHERE (name, id) > ($1, $2)
+        ORDER BY name, id LIMIT $3;
+    PREPARE add_contact_stmt(text, text, text) AS
+        INSERT INTO contacts (name, phone, address) VALUES ($1, $2, $3)
+        ON CONFLICT (phone) DO NOTHING RETURNING id;
+    PREPARE update_contact_stmt(text, text, text, int) AS
+        UPDATE contacts SET name = $1, phone = $2, address = $3 WHERE id = $4;
+    PREPARE delete_contact_stmt(int) AS
+        DELETE FROM contacts WHERE id = $1;
+"""
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+_pool_busy_since = None
+
+class DirectoryConnection(PGConnection):
+    """Connection that tracks whether PREPARED_STATEMENTS ran on it"""
+    statements_prepared = False
+
+def get_db_host():
+    """Database host, or a Unix socket directory when one is asked for"""
+    # The socket is opt-in: it authenticates against pg_hba's "local" lines
+    # (often peer auth), so an explicit localhost keeps using TCP
+    socket_dir = os.getenv('DATABASE_SOCKET_DIR')
+    if socket_dir:
+        return socket_dir
+    host = os.getenv('DATABASE_HOST', 'postgres')
+    if host == '' and os.path.isdir(DEFAULT_SOCKET_DIR):
+        return DEFAULT_SOCKET_DIR
+    return host
+
+def get_db_pool():
+    """Create the process-wide connection pool on first use"""
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                maxconn = int(os.getenv('DATABASE_POOL_MAX', '16'))
+                # putconn() closes a returned connection once minconn are
+                # already idle, so keep min == max by default; otherwise
+                # connections (and their prepared statements) churn per request
+                minconn = int(os.getenv('DATABASE_POOL_MIN', str(maxconn)))
+                pool = ThreadedConnectionPool(
+                    minconn=minconn,
+                    maxconn=maxconn,
+                    host=get_db_host(),
+                    database=os.getenv('DATABASE_NAME', 'phone_directory'),
+                    user=os.getenv('DATABASE_USER', 'postgres'),
+                    password=os.getenv('DATABASE_PASSWORD', 'postgres'),
+                    port=os.getenv('DATABASE_PORT', '5432'),
+                    connection_factory=DirectoryConnection
+                )
+                # getconn() raises once the pool is exhausted; one slot per
+                # connection makes callers wait for a free one instead
+                # (a gevent semaphore once monkey-patched)
+                _pool_slots = threading.BoundedSemaphore(maxconn)
+                _pool = pool
+    return _pool
+
+def get_db_connection(timeout=POOL_TIMEOUT):
+    """Check out a pooled connection for the current request
+    
+    Waits up to timeout seconds for a free connection, then raises PoolError.
+    """
+    if 'db_conn' not in g:
+        acquired = False
+        try:
+            pool = get_db_pool()
+            if not _pool_slots.acquire(timeout=timeout):
+                raise PoolError("timed out waiting for a database connection")
+            acquired = True
+            conn = g.db_conn = pool.getconn()
+            if not conn.statements_prepared:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(PREPARED_STATEMENTS)
+                    conn.commit()
+                except Error:
+                    # PREPARE is not undone by rollback; drop the half-prepared
+                    # session so the pool opens a fresh one next time
+                    conn.close()
+                    raise
+                conn.statements_prepared = True
+        except Error as e:
+            if acquired and 'db_conn' not in g:
+                _pool_slots.release()
+            app.logger.error(f"Database connection error: {e}")
+            raise
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool = get_db_pool()
+        try:
+            # The pool rolls back any open transaction and drops broken connections
+            pool.putconn(conn)
+        except Error as e:
+            # rollback() on a half-dead connection raises before the pool
+            # forgets it; close it so the pool frees its slot anyway
+            app.logger.error(f"Error returning connection to pool: {e}")
+            conn.close()
+            pool.putconn(conn, close=True)
+        finally:
+            _pool_slots.release()
 
 @app.route('/')
 def index():
@@ -31,44 +189,131 @@ def index():
 @app.route('/health')
 def health():
     """Health check endpoint"""
+    global _pool_busy_since
     try:
-        conn = get_db_connection()
-        conn.close()
+        conn = get_db_connection(timeout=HEALTH_POOL_TIMEOUT)
+        _pool_busy_since = None
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
         return jsonify({'status': 'healthy', 'database': 'connected'}), 200
+    except PoolError as e:
+        # A short burst that keeps every connection busy should not get the
+        # pod restarted, but a pool that stays exhausted (e.g. leaked
+        # connections) should
+        now = time.monotonic()
+        if _pool_busy_since is None:
+            _pool_busy_since = now
+        if now - _pool_busy_since < HEALTH_BUSY_GRACE:
+            return jsonify({'status': 'healthy', 'database': 'busy'}), 200
+        return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
+def _contacts_payload(contacts, next_cursor):
+    """Serialize contact rows as a columnar JSON body and its ETag"""
+    # Columnar payload: rows go out as positional arrays, keys only once
+    body = orjson.dumps({
+        'columns': CONTACT_COLUMNS,
+        'rows': contacts,
+        'next_cursor': next_cursor
+    })
+    return body, hashlib.blake2b(body, digest_size=8).hexdigest()
+
+def _search_contacts(search, substring):
+    """Build the JSON body and ETag for a search; results are not cached"""
+    cursor = get_db_connection().cursor()
+    try:
+        if substring:
+            cursor.execute("""
+                SELECT id, name, phone, address 
+                FROM contacts 
+                WHERE search_blob ILIKE %s
+                ORDER BY name
+            """, (f'%{search.lower()}%',))
+        else:
+            cursor.execute("""
+                SELECT id, name, phone, address 
+                FROM contacts 
+                WHERE lower(name) LIKE %s OR lower(phone) LIKE %s
+                ORDER BY name
+            """, (f'{search.lower()}%', f'{search.lower()}%'))
+        return _contacts_payload(cursor.fetchall(), None)
+    finally:
+        cursor.close()
+
+@lru_cache(maxsize=256)
+def _cached_page(version, after_name, after_id, limit):
+    """Build the JSON body and ETag for one listing page at a given data version
+    
+    version comes from the contacts_version row, which triggers bump on
+    every write that changes rows, so entries for older versions are never
+    served again and simply age out of the LRU. Pages hold at most
+    MAX_PAGE_SIZE rows, which bounds the cache's memory.
+    """
+    cursor = get_db_connection().cursor()
+    try:
+        # Fetch one extra row to learn whether another page follows
+        if after_name is None:
+            cursor.execute("EXECUTE list_contacts_stmt(%s)", (limit + 1,))
+        else:
+            cursor.execute(
+                "EXECUTE list_contacts_after_stmt(%s, %s, %s)",
+                (after_name, after_id, limit + 1)
+            )
+        contacts = cursor.fetchall()
+        next_cursor = None
+        if len(contacts) > limit:
+            contacts = contacts[:limit]
+            next_cursor = {'after_name': contacts[-1][1], 'after_id': contacts[-1][0]}
+        return _contacts_payload(contacts, next_cursor)
+    finally:
+        cursor.close()
+
 @app.route('/api/contacts', methods=['GET'])
 def get_contacts():
-    """Get all contacts or search"""
+    """Get a page of contacts, or search"""
     search = request.args.get('search', '')
+    # Prefix matches on name/phone use B-tree indexes; match=substring also
+    # searches inside names, phones and addresses via the trigram index
+    substring = request.args.get('match') == 'substring'
+    
+    # Keyset pagination: the cursor is the (name, id) of the last row seen
+    after_name = request.args.get('after_name')
+    after_id = request.args.get('after_id')
+    try:
+        if after_id is not None:
+            after_id = int(after_id)
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'after_id and limit must be integers'}), 400
+    if (after_name is None) != (after_id is None):
+        return jsonify({'error': 'after_name and after_id must be given together'}), 400
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
         if search:
-            cursor.execute("""
-                SELECT id, name, phone, address 
-                FROM contacts 
-                WHERE name ILIKE %s OR phone ILIKE %s OR address ILIKE %s
-                ORDER BY name
-            """, (f'%{search}%', f'%{search}%', f'%{search}%'))
+            # Unpaginated and unbounded in size, so searches skip the cache
+            body, etag = _search_contacts(search, substring)
         else:
-            cursor.execute("SELECT id, name, phone, address FROM contacts ORDER BY name")
-        
-        contacts = cursor.fetchall()
-        return jsonify([{
-            'id': c[0],
-            'name': c[1],
-            'phone': c[2],
-            'address': c[3]
-        } for c in contacts])
+            # Read the version first: a write committing in between only makes
+            # this entry fresher than its key, never staler
+            cursor.execute("EXECUTE contacts_version_stmt")
+            version = cursor.fetchone()[0]
+            body, etag = _cached_page(version, after_name, after_id, limit)
     except Error as e:
         app.logger.error(f"Error fetching contacts: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
-        conn.close()
+    
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Let clients keep the body but revalidate it with If-None-Match
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/api/contacts', methods=['POST'])
 def add_contact():
@@ -76,29 +321,32 @@ def add_contact():
     data = request.json
     if not data or 'name' not in data or 'phone' not in data:
         return jsonify({'error': 'Name and phone are required'}), 400
+    if not isinstance(data['phone'], str) or not _PHONE_RE.fullmatch(data['phone']):
+        return jsonify({'error': 'Invalid phone number'}), 400
     
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
         cursor.execute(
-            "INSERT INTO contacts (name, phone, address) VALUES (%s, %s, %s) RETURNING id",
+            "EXECUTE add_contact_stmt(%s, %s, %s)",
             (data['name'], data['phone'], data.get('address', ''))
         )
         
-        contact_id = cursor.fetchone()[0]
+        # No row back means the phone was already taken; nothing to roll back
+        row = cursor.fetchone()
         conn.commit()
+        if row is None:
+            return jsonify({'error': 'Phone number already exists'}), 400
+        
         return jsonify({
-            'id': contact_id, 
+            'id': row[0], 
             'message': 'Contact added successfully!'
         }), 201
-    except psycopg2.IntegrityError:
-        return jsonify({'error': 'Phone number already exists'}), 400
     except Error as e:
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
-        conn.close()
 
 @app.route('/api/contacts/<int:contact_id>', methods=['PUT'])
 def update_contact(contact_id):
@@ -106,16 +354,17 @@ def update_contact(contact_id):
     data = request.json
     if not data or 'name' not in data or 'phone' not in data:
         return jsonify({'error': 'Name and phone are required'}), 400
+    if not isinstance(data['phone'], str) or not _PHONE_RE.fullmatch(data['phone']):
+        return jsonify({'error': 'Invalid phone number'}), 400
     
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            UPDATE contacts 
-            SET name = %s, phone = %s, address = %s 
-            WHERE id = %s
-        """, (data['name'], data['phone'], data.get('address', ''), contact_id))
+        cursor.execute(
+            "EXECUTE update_contact_stmt(%s, %s, %s, %s)",
+            (data['name'], data['phone'], data.get('address', ''), contact_id)
+        )
         
         conn.commit()
         if cursor.rowcount == 0:
@@ -126,7 +375,6 @@ def update_contact(contact_id):
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
-        conn.close()
 
 @app.route('/api/contacts/<int:contact_id>', methods=['DELETE'])
 def delete_contact(contact_id):
@@ -135,7 +383,7 @@ def delete_contact(contact_id):
     cursor = conn.cursor()
     
     try:
-        cursor.execute("DELETE FROM contacts WHERE id = %s", (contact_id,))
+        cursor.execute("EXECUTE delete_contact_stmt(%s)", (contact_id,))
         conn.commit()
         
         if cursor.rowcount == 0:
@@ -146,36 +394,39 @@ def delete_contact(contact_id):
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
-        conn.close()
 
 @app.route('/api/contacts/export', methods=['GET'])
 def export_contacts():
     """Export contacts as CSV"""
     conn = get_db_connection()
-    cursor = conn.cursor()
+    # Named cursor: rows stay on the server and are fetched in itersize batches
+    cursor = conn.cursor(name='export_cur')
+    cursor.itersize = 2000
+    # Spool to disk past 1 MiB so large exports keep memory bounded
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE, mode='w+b')
     
     try:
-        cursor.execute("SELECT name, phone, address, created_at FROM contacts ORDER BY name")
-        contacts = cursor.fetchall()
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
+        cursor.execute(EXPORT_SQL)
+        # writerows() drives the cursor from C, one call for the whole export;
+        # the connection goes back to the pool before the client downloads
+        text = io.TextIOWrapper(output, encoding='utf-8', newline='', write_through=True)
+        writer = csv.writer(text)
         writer.writerow(['Name', 'Phone', 'Address', 'Created At'])
-        writer.writerows(contacts)
-        
+        writer.writerows(cursor)
+        text.flush()
+        text.detach()
         output.seek(0)
         return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8')),
+            output,
             mimetype='text/csv',
             as_attachment=True,
             download_name='contacts_export.csv'
         )
     except Error as e:
+        output.close()
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
-        conn.close()
 
 # Production Gunicorn entry point
 if __name__ == '__main__':
@@ -0,0 +1,25 @@
+# File: web/gunicorn.conf.py
+# Gunicorn configuration for the web application
+import os
+
+bind = '0.0.0.0:5000'
+
+# gevent workers overlap many requests waiting on Postgres in one process, so
+# a couple of them per pod is enough. Each worker owns its own connection
+# pool, and Postgres allows 100 connections by default: keep
+# replicas x workers x DATABASE_POOL_MAX below it (2 x 2 x 16 = 64).
+worker_class = 'gevent'
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+
+# Accept roughly as many requests as the pool can serve at once; the few extra
+# greenlets let /health and static pages through while queries wait on the pool
+pool_size = int(os.getenv('DATABASE_POOL_MAX', '16'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', pool_size + 4))
+
+# Import the app once in the master and fork it into the workers; the
+# connection pool is created lazily, so no sockets are shared across forks
+preload_app = True
+
+timeout = 120
+accesslog = '-'
+errorlog = '-'